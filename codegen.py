@@ -0,0 +1,116 @@
+import keyword
+from collections import OrderedDict
+
+
+class DFACodeGenerator:
+    """
+    Class for turning a DFA (e.g. the result of DFAfromNFA.getMinimisedDFA()) into specialised Python source.
+    The generated function matches the whole input and returns True or False.
+
+    Styles:
+        "table"    - a loop over a pre-bound tuple of per-state dictionaries
+        "dispatch" - an if/elif chain per state with the character tests inlined
+    """
+
+    styles = ("table", "dispatch")
+    compiled = OrderedDict()  # Generated source -> compiled function, least recently used first
+    cachesize = 128  # Most compiled functions kept in DFACodeGenerator.compiled
+
+    def __init__(self, dfa, style="table", name="match"):
+        if style not in self.styles:
+            raise ValueError(f"Unknown code generation style '{style}'")
+        if not name.isidentifier() or keyword.iskeyword(name):
+            raise ValueError(f"Function name '{name}' is not a valid Python identifier")
+        self.dfa = dfa
+        self.style = style
+        self.name = name
+        self.source = None
+
+    def getSource(self):
+        if self.source is None:
+            if self.style == "table":
+                self.source = self.generateTable()
+            else:
+                self.source = self.generateDispatch()
+        return self.source
+
+    def compile(self):
+        """Compile the generated source once and return the matcher function."""
+        source = self.getSource()
+        compiled = DFACodeGenerator.compiled
+        if source in compiled:
+            compiled.move_to_end(source)
+        else:
+            namespace = {}
+            exec(compile(source, f"<dfa {self.name}>", "exec"), namespace)
+            compiled[source] = namespace[self.name]
+            if len(compiled) > DFACodeGenerator.cachesize:
+                compiled.popitem(last=False)
+        return compiled[source]
+
+    def writeModule(self, path):
+        """Write the generated source to a .py file that can be imported without a compile step."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.getSource())
+
+    def renumber(self):
+        """Map the DFA states onto 1..k with the start state first, so they can index a tuple."""
+        translations = {self.dfa.startstate: 1}
+        for state in sorted(self.dfa.states):
+            if state not in translations:
+                translations[state] = len(translations) + 1
+        rows = [{} for _ in range(len(translations) + 1)]
+        for state, row in self.dfa.getTransitionTable().items():
+            for char in sorted(row):
+                rows[translations[state]][char] = translations[row[char]]
+        finals = sorted(translations[s] for s in self.dfa.finalstates)
+        return [rows, finals]
+
+    def generateTable(self):
+        [rows, finals] = self.renumber()
+        lines = ["# Generated by codegen.py from a DFA. Do not edit.", "", "_TRANSITIONS = ("]
+        lines.append("    None,")
+        for row in rows[1:]:
+            lines.append("    {" + ", ".join(f"{char!r}: {tostate}" for char, tostate in row.items()) + "},")
+        lines.append(")")
+        lines.append(f"_FINALS = frozenset({finals!r})")
+        lines.append("")
+        lines.append("")
+        lines.append(f"def {self.name}(text, _transitions=_TRANSITIONS, _finals=_FINALS):")
+        lines.append("    state = 1")
+        lines.append("    for char in text:")
+        lines.append("        state = _transitions[state].get(char)")
+        lines.append("        if state is None:")
+        lines.append("            return False")
+        lines.append("    return state in _finals")
+        return "\n".join(lines) + "\n"
+
+    def generateDispatch(self):
+        [rows, finals] = self.renumber()
+        lines = ["# Generated by codegen.py from a DFA. Do not edit.", "", ""]
+        lines.append(f"def {self.name}(text):")
+        lines.append("    state = 1")
+        lines.append("    for char in text:")
+        for state in range(1, len(rows)):
+            branch = "if" if state == 1 else "elif"
+            lines.append(f"        {branch} state == {state}:")
+            # Group the characters by target state so each target needs a single test
+            targets = {}
+            for char, tostate in rows[state].items():
+                targets.setdefault(tostate, []).append(char)
+            test = "if"
+            for tostate, chars in targets.items():
+                if len(chars) == 1:
+                    condition = f"char == {chars[0]!r}"
+                else:
+                    condition = "char in {" + ", ".join(repr(char) for char in chars) + "}"
+                lines.append(f"            {test} {condition}:")
+                lines.append(f"                state = {tostate}")
+                test = "elif"
+            if targets:
+                lines.append("            else:")
+                lines.append("                return False")
+            else:
+                lines.append("            return False")
+        lines.append(f"    return state in {set(finals)!r}" if finals else "    return False")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,124 @@
+import random
+
+
+class DFALanguage:
+    """
+    Class for counting, enumerating and sampling the strings accepted by a DFA
+    (e.g. the result of DFAfromNFA.getMinimisedDFA()) without materialising the language.
+    """
+
+    def __init__(self, dfa):
+        self.dfa = dfa
+        self.table = dfa.getTransitionTable()
+        self.finalstates = set(dfa.finalstates)
+        self.alphabet = sorted({char for row in self.table.values() for char in row})
+        # ways[n][state] = number of accepted strings of length n starting from state
+        self.ways = [{state: int(state in self.finalstates) for state in self.table}]
+        self.livestates = self.findLiveStates()
+
+    def getWays(self, n):
+        """Extend the counting table up to length n and return the counts for that length."""
+        while len(self.ways) <= n:
+            previous = self.ways[-1]
+            self.ways.append({state: sum(previous[tostate] for tostate in row.values())
+                              for state, row in self.table.items()})
+        return self.ways[n]
+
+    def count(self, n):
+        """Return the exact number of accepted strings of length n."""
+        if n < 0:
+            raise ValueError("Length 'n' must not be negative")
+        if n <= len(self.table) or n < len(self.ways):
+            return self.getWays(n)[self.dfa.startstate]
+        return self.countByMatrixPower(n)
+
+    def countByMatrixPower(self, n):
+        """
+        Count accepted strings of length n by raising the transition count matrix to the n-th power,
+        which takes O(k^3 log n) big-int operations for k states instead of O(n) table rows.
+        """
+        states = sorted(self.table)
+        index = {state: i for i, state in enumerate(states)}
+        size = len(states)
+        matrix = [[0] * size for _ in range(size)]
+        for state, row in self.table.items():
+            for tostate in row.values():
+                matrix[index[state]][index[tostate]] += 1
+
+        vector = [int(state in self.finalstates) for state in states]
+        while n:
+            if n & 1:
+                vector = [sum(x * y for x, y in zip(line, vector)) for line in matrix]
+            matrix = [[sum(line[k] * matrix[k][j] for k in range(size)) for j in range(size)] for line in matrix]
+            n >>= 1
+        return vector[index[self.dfa.startstate]]
+
+    def enumerate(self):
+        """
+        Lazily generate every accepted string in shortlex order (by length, then alphabetically).
+        Branches that cannot reach a final state within the remaining length are never explored,
+        and the generator stops once no string of the current length or longer can be accepted.
+        """
+        length = 0
+        frontier = {self.dfa.startstate}
+        while frontier:
+            if self.getWays(length)[self.dfa.startstate]:
+                yield from self.enumerateLength(length)
+            frontier = self.liveSuccessors(frontier)
+            length += 1
+
+    def enumerateLength(self, n):
+        """Lazily generate the accepted strings of length n in lexicographic order."""
+        self.getWays(n)
+        stack = [(self.dfa.startstate, (), n)]
+        while stack:
+            state, prefix, remaining = stack.pop()
+            if remaining == 0:
+                yield self.dfa.spell(prefix)
+                continue
+            row = self.table[state]
+            for char in reversed(self.alphabet):
+                tostate = row.get(char)
+                if tostate is not None and self.ways[remaining - 1][tostate]:
+                    stack.append((tostate, prefix + (char,), remaining - 1))
+
+    def liveSuccessors(self, states):
+        """Return the successors of states that can still reach a final state."""
+        return {tostate for state in states for tostate in self.table[state].values() if tostate in self.livestates}
+
+    def findLiveStates(self):
+        """Return the states from which a final state can be reached."""
+        predecessors = {state: set() for state in self.table}
+        for state, row in self.table.items():
+            for tostate in row.values():
+                predecessors[tostate].add(state)
+        live = set(self.finalstates)
+        stack = list(self.finalstates)
+        while stack:
+            for state in predecessors[stack.pop()]:
+                if state not in live:
+                    live.add(state)
+                    stack.append(state)
+        return live
+
+    def sample(self, n, rng=None):
+        """Return an accepted string of length n chosen uniformly at random."""
+        rng = rng if rng else random
+        total = self.count(n)
+        if total == 0:
+            raise ValueError(f"No accepted strings of length {n}")
+        self.getWays(n)
+        state = self.dfa.startstate
+        chars = []
+        for remaining in range(n, 0, -1):
+            pick = rng.randrange(self.ways[remaining][state])
+            for char in self.alphabet:
+                tostate = self.table[state].get(char)
+                if tostate is None:
+                    continue
+                if pick < self.ways[remaining - 1][tostate]:
+                    chars.append(char)
+                    state = tostate
+                    break
+                pick -= self.ways[remaining - 1][tostate]
+        return self.dfa.spell(chars)
@@ -1,10 +1,16 @@
-from nfa import Automata
+from nfa import Automata, BuildAutomata
 
 class DFAfromNFA:
-    def __init__(self, nfa, alphabet):
+    def __init__(self, nfa, alphabet=None):
+        if alphabet is None:
+            alphabet = nfa.language
         self.alphabet = {char for char in alphabet if char in nfa.language}
+        self.classes = self.findSymbolClasses(nfa)
+        self.nfa = nfa
         self.dfa = None
         self.minDFA = None
+        self.reversedDFA = None
+        self.reversedUnanchoredDFA = None
         self.buildDFA(nfa)
         self.minimise()
 
@@ -14,57 +20,98 @@ class DFAfromNFA:
     def getMinimisedDFA(self):
         return self.minDFA
 
+    def getReversedDFA(self):
+        """Return the minimised DFA for the reversed language, built on first use."""
+        if self.reversedDFA is None:
+            reverse = BuildAutomata.reverseStruct(self.nfa)
+            self.reversedDFA = DFAfromNFA(reverse, self.alphabet).getMinimisedDFA()
+        return self.reversedDFA
+
+    def getReversedUnanchoredDFA(self):
+        """
+        Return the minimised DFA that accepts every string whose reversal starts with a match,
+        built on first use. Scanning text backwards with it finds every position where a match starts.
+        """
+        if self.reversedUnanchoredDFA is None:
+            unanchored = BuildAutomata.unanchoredStruct(BuildAutomata.reverseStruct(self.nfa))
+            self.reversedUnanchoredDFA = DFAfromNFA(unanchored, self.alphabet).getMinimisedDFA()
+        return self.reversedUnanchoredDFA
+
     def displayDFA(self):
         self.dfa.display()
 
     def displayMinimisedDFA(self):
         self.minDFA.display()
 
+    def getSymbolClasses(self):
+        return self.classes
+
+    def findSymbolClasses(self, nfa):
+        """
+        Group the alphabet into classes of symbols that label exactly the same NFA transitions.
+        Symbols of one class behave identically in every DFA built from the NFA, so only one
+        representative per class has to be explored. Byte-level automata usually need far fewer
+        than 256 classes. The classes are sorted by their smallest symbol.
+        """
+        edges = {char: [] for char in self.alphabet}
+        for fromstate, tostates in nfa.transitions.items():
+            for tostate, chars in tostates.items():
+                for char in chars:
+                    if char in edges:
+                        edges[char].append((fromstate, tostate))
+        classes = {}
+        for char in sorted(self.alphabet):
+            classes.setdefault(tuple(edges[char]), []).append(char)
+        return sorted(classes.values(), key=lambda symbols: symbols[0])
+
     def buildDFA(self, nfa):
-        allstates = {}
-        eclose = {}
-        count = 1
+        # Subsets of NFA states are bitsets over nfa.bitorder, built from the precomputed epsilon closures
+        closures = nfa.getEClosures()
+        finalbits = nfa.statesToBits(nfa.finalstates)
+
+        # moves[state][char] = union of the closures of the states reached from state on char
+        moves = {}
+        for fromstate in nfa.bitorder:
+            moves[fromstate] = {}
+            for tostate, chars in nfa.transitions.get(fromstate, {}).items():
+                for char in chars:
+                    if char != Automata.epsilon():
+                        moves[fromstate][char] = moves[fromstate].get(char, 0) | closures[tostate]
 
-        # Calculate the epsilon closure for the start state
-        state1 = frozenset(sorted(nfa.getEClose(nfa.startstate)))
-        eclose[nfa.startstate] = state1
+        count = 1
+        state1 = closures[nfa.startstate]
         dfa = Automata(nfa.language)
         dfa.setstartstate(count)
         states = [[state1, count]]
-        allstates[count] = state1
+        allstates = {state1: count}
         count += 1
 
         while states:
             state, fromindex = states.pop()
-            for char in sorted(self.alphabet):
+            reachable = {}
+            for s in nfa.bitsToStates(state):
+                for char, bits in moves[s].items():
+                    reachable[char] = reachable.get(char, 0) | bits
+
+            for symbols in self.classes:
+                char = symbols[0]
                 if char == Automata.epsilon():
                     continue
 
-                trstates = set()
-                for s in state:
-                    trstates.update(nfa.gettransitions(s, char))
-
-                expanded_trstates = set()
-                for s in trstates:
-                    if s not in eclose:
-                        eclose[s] = nfa.getEClose(s)
-                    expanded_trstates.update(eclose[s])
-
-                trstates = frozenset(sorted(expanded_trstates))
-
+                trstates = reachable.get(char, 0)
                 if trstates:
-                    if trstates not in allstates.values():
+                    if trstates not in allstates:
                         states.append([trstates, count])
-                        allstates[count] = trstates
+                        allstates[trstates] = count
                         toindex = count
                         count += 1
                     else:
-                        toindex = [k for k, v in allstates.items() if v == trstates][0]
-                    dfa.addtransition(fromindex, toindex, char)
+                        toindex = allstates[trstates]
+                    dfa.addtransition(fromindex, toindex, set(symbols))
 
         # Handle final states carefully, ensuring only correct final states are marked
-        for value, state in allstates.items():
-            if any(final in state for final in nfa.finalstates):
+        for state, value in sorted(allstates.items(), key=lambda item: item[1]):
+            if state & finalbits:
                 dfa.addfinalstates(value)
 
         self.dfa = dfa
@@ -82,7 +129,8 @@ class DFAfromNFA:
                 splits = {}
                 for state in part:
                     key = tuple(
-                        self.find_partition(self.get_trans_state(state, char), partitions) for char in sorted(self.alphabet)
+                        self.find_partition(self.get_trans_state(state, symbols[0]), partitions)
+                        for symbols in self.classes
                     )
                     if key not in splits:
                         splits[key] = set()
@@ -123,3 +171,136 @@ class DFAfromNFA:
             if state in part:
                 return i
         return -1
+
+
+class TaggedDFAfromNFA:
+    """
+    Tagged DFA (after Laurikari) for an NFA built with NFAfromRegex(..., captures=True).
+
+    Every DFA state is an ordered list of NFA threads, highest priority first. Each thread owns a row of
+    registers holding the positions of the group tags. A transition copies the registers of the thread a
+    new thread came from and stores the current position in the tags crossed on the way, so the group
+    spans of a match are recovered in a single left-to-right pass with two fixed register buffers.
+
+    When a group can match in several ways, the spans follow the NFA priority order: alternatives are
+    tried left to right and stars are greedy. A group inside a star reports its last iteration.
+    """
+
+    def __init__(self, nfa, alphabet=None):
+        if alphabet is None:
+            alphabet = nfa.language
+        self.alphabet = {char for char in alphabet if char in nfa.language}
+        tags = [Automata.tagIndex(char) for tostates in nfa.transitions.values()
+                for chars in tostates.values() for char in chars]
+        self.groups = max([tag // 2 for tag in tags if tag is not None], default=0)
+        self.registers = 2 * (self.groups + 1)
+        self.startstate = 1
+        self.startops = None
+        self.transitions = {}
+        self.finals = {}
+        self.threads = 0
+        self.buildTDFA(nfa)
+
+    def getGroupCount(self):
+        return self.groups
+
+    def closure(self, nfa, state, finalstates):
+        """
+        Return [(state, tags)] for the states reachable from state through epsilon moves, in priority
+        order and each state once, where tags are the tags crossed on the way. Only states that
+        consume input or are final are kept.
+        """
+        result = []
+        seen = set()
+        stack = [(state, ())]
+        while stack:
+            s, tags = stack.pop()
+            if s in seen:
+                continue
+            seen.add(s)
+            children = []
+            consumes = s in finalstates
+            for tns, chars in nfa.transitions.get(s, {}).items():
+                if Automata.epsilon() in chars:
+                    crossed = tuple(Automata.tagIndex(char) for char in chars if Automata.tagIndex(char) is not None)
+                    children.append((tns, tags + crossed))
+                else:
+                    consumes = True
+            if consumes:
+                result.append((s, tags))
+            stack.extend(reversed(children))
+        return result
+
+    def addThreads(self, nfa, threads, ops, source, state, tags, finalstates):
+        for s, crossed in self.closure(nfa, state, finalstates):
+            if s not in threads:
+                threads.append(s)
+                ops.append((source, tags + crossed))
+
+    def buildTDFA(self, nfa):
+        finalstates = set(nfa.finalstates)
+        threads = []
+        ops = []
+        self.addThreads(nfa, threads, ops, -1, nfa.startstate, (), finalstates)
+        self.startops = tuple(ops)
+        allstates = {tuple(threads): self.startstate}
+        states = [tuple(threads)]
+
+        while states:
+            config = states.pop()
+            fromindex = allstates[config]
+            self.transitions[fromindex] = {}
+            self.threads = max(self.threads, len(config))
+            for i, s in enumerate(config):
+                if s in finalstates:
+                    self.finals[fromindex] = i
+                    break
+
+            for char in sorted(self.alphabet):
+                threads = []
+                ops = []
+                for i, s in enumerate(config):
+                    for tns, chars in nfa.transitions.get(s, {}).items():
+                        if char in chars and Automata.epsilon() not in chars:
+                            self.addThreads(nfa, threads, ops, i, tns, (), finalstates)
+                if not threads:
+                    continue
+                toconfig = tuple(threads)
+                if toconfig not in allstates:
+                    allstates[toconfig] = len(allstates) + 1
+                    states.append(toconfig)
+                self.transitions[fromindex][char] = (allstates[toconfig], tuple(ops))
+
+        print("Tagged DFA Construction Complete")
+
+    def match(self, text):
+        """
+        Match the whole text and return [(start, end) or None for each group], where entry 0 is the
+        whole match and entry g the span of group g. Return None if the text is not accepted.
+        """
+        current = [[None] * self.registers for _ in range(self.threads)]
+        spare = [[None] * self.registers for _ in range(self.threads)]
+        for j, (source, tags) in enumerate(self.startops):
+            for tag in tags:
+                current[j][tag] = 0
+
+        state = self.startstate
+        for pos, char in enumerate(text):
+            entry = self.transitions[state].get(char)
+            if entry is None:
+                return None
+            state, ops = entry
+            for j, (source, tags) in enumerate(ops):
+                spare[j][:] = current[source]
+                for tag in tags:
+                    spare[j][tag] = pos + 1
+            current, spare = spare, current
+
+        if state not in self.finals:
+            return None
+        registers = current[self.finals[state]]
+        spans = [(0, len(text))]
+        for group in range(1, self.groups + 1):
+            start, end = registers[2 * group], registers[2 * group + 1]
+            spans.append((start, end) if start is not None and end is not None else None)
+        return spans
@@ -7,14 +7,34 @@ class Automata:
         self.finalstates = []
         self.transitions = dict()
         self.language = language
+        self.eclosures = None  # Cached by getEClosures(), reset whenever the automaton changes
+        self.bitorder = []
+        self.bitindex = {}
 
     @staticmethod
     def epsilon():
         return ":e:"  # Epsilon transition symbol
 
+    @staticmethod
+    def tag(index):
+        """
+        Tag symbol recording a group boundary. Tag transitions are labelled {epsilon, tag}, so they are
+        plain epsilon moves for everything except TaggedDFAfromNFA.
+        """
+        return f":t{index}:"
+
+    @staticmethod
+    def tagIndex(symbol):
+        """Return the index of a tag symbol, or None for any other symbol."""
+        if isinstance(symbol, str) and symbol.startswith(":t") and symbol.endswith(":"):
+            return int(symbol[2:-1])
+        return None
+
     def addstate(self, state):
         """Add a state to the automaton and initialize its transition dictionary."""
-        self.states.add(state)
+        if state not in self.states:
+            self.states.add(state)
+            self.eclosures = None
         if state not in self.transitions:
             self.transitions[state] = {}
 
@@ -33,7 +53,8 @@ class Automata:
     def addtransition(self, fromstate, tostate, regex):
         self.addstate(fromstate)
         self.addstate(tostate)
-        if isinstance(regex, str):
+        self.eclosures = None
+        if isinstance(regex, (str, int)):  # A single character, or a single byte value
             regex = {regex}
         if fromstate in self.transitions:
             if tostate in self.transitions[fromstate]:
@@ -59,17 +80,110 @@ class Automata:
                         trstates.add(tns)
         return trstates
 
+    def getTransitionTable(self):
+        """
+        Return the transitions of a deterministic automaton as {state: {char: tostate}}.
+        Missing entries lead to the (implicit) dead state.
+        """
+        table = {state: {} for state in self.states}
+        for fromstate, tostates in self.transitions.items():
+            for tostate, chars in tostates.items():
+                for char in chars:
+                    table[fromstate][char] = tostate
+        return table
+
+    def spell(self, symbols):
+        """Join a sequence of transition labels into a string, or into bytes for byte-level automata."""
+        if any(isinstance(char, int) for char in self.language):
+            return bytes(symbols)
+        return "".join(symbols)
+
     def getEClose(self, findstate):
-        allstates = set()
-        states = {findstate}
-        while states:
-            state = states.pop()
-            allstates.add(state)
-            if state in self.transitions:
-                for tns in list(self.transitions[state]):  # Use list to avoid modifying the set during iteration
-                    if Automata.epsilon() in self.transitions[state][tns] and tns not in allstates:
-                        states.add(tns)
-        return allstates
+        return self.bitsToStates(self.getEClosures()[findstate])
+
+    def getEClosures(self):
+        """
+        Return {state: bitset of its epsilon closure}, computed once per automaton.
+        Bit i stands for self.bitorder[i]. Epsilon cycles are collapsed with Tarjan's algorithm,
+        so all states of a strongly connected component share one closure, and each component's
+        closure is built from the closures of the components it leads to.
+        """
+        if self.eclosures is not None:
+            return self.eclosures
+
+        self.bitorder = sorted(self.states)
+        self.bitindex = {state: i for i, state in enumerate(self.bitorder)}
+        bits = {state: 1 << i for i, state in enumerate(self.bitorder)}
+        successors = {state: [tns for tns, chars in self.transitions.get(state, {}).items()
+                              if Automata.epsilon() in chars] for state in self.bitorder}
+        closures = {}
+        index = {}
+        low = {}
+        stack = []
+        onstack = set()
+
+        for root in self.bitorder:
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            onstack.add(root)
+            work = [(root, iter(successors[root]))]
+            while work:
+                state, pending = work[-1]
+                descended = False
+                for tns in pending:
+                    if tns not in index:
+                        index[tns] = low[tns] = len(index)
+                        stack.append(tns)
+                        onstack.add(tns)
+                        work.append((tns, iter(successors[tns])))
+                        descended = True
+                        break
+                    elif tns in onstack:
+                        low[state] = min(low[state], index[tns])
+                if descended:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[state])
+                if low[state] == index[state]:
+                    # Components are completed in reverse topological order, so every
+                    # component reachable from this one already has its closure
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        onstack.discard(member)
+                        component.append(member)
+                        if member == state:
+                            break
+                    closure = 0
+                    for member in component:
+                        closure |= bits[member]
+                        for tns in successors[member]:
+                            if tns in closures:
+                                closure |= closures[tns]
+                    for member in component:
+                        closures[member] = closure
+
+        self.eclosures = closures
+        return closures
+
+    def statesToBits(self, states):
+        self.getEClosures()
+        bits = 0
+        for state in states:
+            bits |= 1 << self.bitindex[state]
+        return bits
+
+    def bitsToStates(self, bits):
+        states = set()
+        while bits:
+            low = bits & -bits
+            states.add(self.bitorder[low.bit_length() - 1])
+            bits ^= low
+        return states
 
     def display(self):
         print("States:", sorted(self.states))
@@ -83,7 +197,7 @@ class Automata:
                     print(f"  {fromstate} --{char}--> {state}")
 
     def getPrintText(self):
-        text = "Language: {" + ", ".join(self.language) + "}\n"
+        text = "Language: {" + ", ".join(map(str, self.language)) + "}\n"
         text += "States: {" + ", ".join(map(str, sorted(self.states))) + "}\n"
         text += "Start State: " + str(self.startstate) + "\n"
         text += "Final States: {" + ", ".join(map(str, sorted(self.finalstates))) + "}\n"
@@ -93,10 +207,21 @@ class Automata:
             tostates = self.transitions[fromstate]
             for state in sorted(tostates.keys()):
                 for char in sorted(tostates[state]):
-                    text += "    " + str(fromstate) + " -> " + str(state) + " on '" + char + "'\n"
+                    text += "    " + str(fromstate) + " -> " + str(state) + " on '" + str(char) + "'\n"
                     linecount += 1
         return [text, linecount]
 
+    def copy(self):
+        """Return an independent copy with the same states, final states and transitions."""
+        rebuild = Automata(set(self.language))
+        rebuild.setstartstate(self.startstate)
+        rebuild.addfinalstates(self.finalstates)
+        for fromstate, tostates in self.transitions.items():
+            rebuild.addstate(fromstate)
+            for state in tostates:
+                rebuild.addtransition(fromstate, state, set(tostates[state]))
+        return rebuild
+
     def newBuildFromNumber(self, startnum):
         translations = {}
         for i in sorted(self.states):
@@ -186,8 +311,9 @@ class BuildAutomata:
         star.addfinalstates(state2)
         star.addtransition(star.startstate, a.startstate, Automata.epsilon())
         star.addtransition(star.startstate, star.finalstates[0], Automata.epsilon())
-        star.addtransition(a.finalstates[0], star.finalstates[0], Automata.epsilon())
+        # Loop back before leaving, so that epsilon moves are listed in greedy priority order
         star.addtransition(a.finalstates[0], a.startstate, Automata.epsilon())  # Loop back for Kleene star
+        star.addtransition(a.finalstates[0], star.finalstates[0], Automata.epsilon())
         star.addtransition_dict(a.transitions)
         return star
 
@@ -240,3 +366,107 @@ class BuildAutomata:
         repeated = BuildAutomata.dotstruct(repeated, loop)
 
         return repeated
+
+    @staticmethod
+    def tagStruct(a, group):
+        """
+        Wrap a in tag transitions for capture group number group: tag 2 * group is set on entry
+        and tag 2 * group + 1 on exit.
+        """
+        [a, m1] = a.newBuildFromNumber(2)
+        state1 = 1
+        state2 = m1
+        tagged = Automata()
+        tagged.setstartstate(state1)
+        tagged.addfinalstates(state2)
+        tagged.addtransition(tagged.startstate, a.startstate, {Automata.epsilon(), Automata.tag(2 * group)})
+        tagged.addtransition(a.finalstates[0], tagged.finalstates[0],
+                             {Automata.epsilon(), Automata.tag(2 * group + 1)})
+        tagged.addtransition_dict(a.transitions)
+        return tagged
+
+    @staticmethod
+    def reverseStruct(a):
+        """
+        Create an NFA for the reversed language of a by flipping every transition.
+        A new start state (1) leads to all the old final states, and the old start state becomes final.
+        """
+        reverse = Automata(a.language)
+        reverse.setstartstate(1)
+        for fromstate, tostates in a.transitions.items():
+            for state in tostates:
+                reverse.addtransition(state + 1, fromstate + 1, set(tostates[state]))
+        for s in a.finalstates:
+            reverse.addtransition(reverse.startstate, s + 1, Automata.epsilon())
+        reverse.addfinalstates(a.startstate + 1)
+        return reverse
+
+    @staticmethod
+    def unanchoredStruct(a):
+        """
+        Create an NFA for (language)*a, so that a match of a may start at any position.
+        Unlike dotstruct this keeps every final state of a.
+        """
+        unanchored = Automata(a.language)
+        unanchored.setstartstate(1)
+        unanchored.addtransition(unanchored.startstate, unanchored.startstate, set(a.language))
+        unanchored.addtransition(unanchored.startstate, a.startstate + 1, Automata.epsilon())
+        for fromstate, tostates in a.transitions.items():
+            for state in tostates:
+                unanchored.addtransition(fromstate + 1, state + 1, set(tostates[state]))
+        unanchored.addfinalstates([s + 1 for s in a.finalstates])
+        return unanchored
+
+    @staticmethod
+    def utf8Sequences(lo, hi):
+        """
+        Split the code point range [lo, hi] into sequences of byte ranges [(first, last), ...] such that
+        the UTF-8 encodings of the range are exactly the byte strings matching one of the sequences.
+        Surrogates (U+D800 to U+DFFF) cannot be encoded and are left out.
+        """
+        if lo > hi:
+            return []
+        if lo <= 0xDFFF and hi >= 0xD800:
+            return BuildAutomata.utf8Sequences(lo, 0xD7FF) + BuildAutomata.utf8Sequences(0xE000, hi)
+        # Split where the encoded length changes
+        for boundary in (0x7F, 0x7FF, 0xFFFF):
+            if lo <= boundary < hi:
+                return BuildAutomata.utf8Sequences(lo, boundary) + BuildAutomata.utf8Sequences(boundary + 1, hi)
+        # Split until every continuation byte covers either a single value or its full 0x80-0xBF range
+        for i in (1, 2, 3):
+            mask = (1 << (6 * i)) - 1
+            if lo & ~mask != hi & ~mask:
+                if lo & mask != 0:
+                    return BuildAutomata.utf8Sequences(lo, lo | mask) + \
+                           BuildAutomata.utf8Sequences((lo | mask) + 1, hi)
+                if hi & mask != mask:
+                    return BuildAutomata.utf8Sequences(lo, (hi & ~mask) - 1) + \
+                           BuildAutomata.utf8Sequences(hi & ~mask, hi)
+        return [list(zip(chr(lo).encode("utf-8"), chr(hi).encode("utf-8")))]
+
+    @staticmethod
+    def utf8RangeStruct(ranges):
+        """
+        Create an NFA over byte values (0-255) matching the UTF-8 encoding of any code point
+        in the given [(lo, hi), ...] ranges. Like the other structs, the start state is 1 and
+        the single final state has the highest number.
+        """
+        sequences = [sequence for lo, hi in ranges for sequence in BuildAutomata.utf8Sequences(lo, hi)]
+        struct = Automata(set())
+        struct.setstartstate(1)
+        finalstate = 2 + sum(len(sequence) - 1 for sequence in sequences)
+        nextstate = 2
+        for sequence in sequences:
+            state = struct.startstate
+            for j, (first, last) in enumerate(sequence):
+                if j == len(sequence) - 1:
+                    tostate = finalstate
+                else:
+                    tostate = nextstate
+                    nextstate += 1
+                symbols = set(range(first, last + 1))
+                struct.addtransition(state, tostate, symbols)
+                struct.language.update(symbols)
+                state = tostate
+        struct.addfinalstates(finalstate)
+        return struct
@@ -2,18 +2,36 @@ import re
 from nfa import BuildAutomata
 
 class NFAfromRegex:
-    def __init__(self, regex, alphabet=None):
+    def __init__(self, regex, alphabet=None, utf8=False, cache=None, captures=False):
         self.star = '*'
         self.plus = '+'
         self.dot = '.'
         self.openingBracket = '('
         self.closingBracket = ')'
+        self.openingClass = '['
+        self.closingClass = ']'
         self.epsilon = '€'  # Epsilon symbol
         self.operators = [self.plus, self.dot]
         self.regex = regex
-        self.alphabet = alphabet if alphabet else [chr(i) for i in range(65, 91)] + \
-                                                [chr(i) for i in range(97, 123)] + \
-                                                [chr(i) for i in range(48, 58)]
+        # In UTF-8 mode every character is lowered to its UTF-8 bytes, and any character that is not
+        # an operator is a literal unless an alphabet is given
+        self.utf8 = utf8
+        self.reserved = {self.star, self.plus, self.dot, self.openingBracket, self.closingBracket,
+                         self.openingClass, self.closingClass, self.epsilon, "{", "}"}
+        if utf8 and not alphabet:
+            self.alphabet = None
+        else:
+            self.alphabet = alphabet if alphabet else [chr(i) for i in range(65, 91)] + \
+                                                    [chr(i) for i in range(97, 123)] + \
+                                                    [chr(i) for i in range(48, 58)]
+        # Hash-consing table: canonical subexpression (operator, operand ids, parameters) -> [id, automaton].
+        # Identical subexpressions are compiled once; pass the same dict to several NFAfromRegex objects
+        # to share fragments between patterns. Cached automata are shared, so they must not be modified.
+        self.cache = cache if cache is not None else {}
+        # With captures enabled every parenthesised group is wrapped in tag transitions
+        # (see BuildAutomata.tagStruct), numbered from 1 in order of the opening brackets
+        self.captures = captures
+        self.groups = 0
         self.buildNFA()
 
     def getNFA(self):
@@ -22,37 +40,55 @@ class NFAfromRegex:
     def displayNFA(self):
         self.nfa.display()
 
+    def isLiteral(self, char):
+        if self.alphabet is None:
+            return len(char) == 1 and char not in self.reserved
+        return char in self.alphabet
+
+    def endsOperand(self, previous):
+        return self.isLiteral(previous) or previous in [self.closingBracket, self.closingClass, self.star, "}"]
+
     def buildNFA(self):
         language = set()
         self.stack = []
         self.automata = []
+        self.terms = []  # Ids of the subexpressions on the automata stack
+        self.groupstack = []  # Group numbers of the open brackets
         previous = "::e::"
         i = 0
 
         try:
             while i < len(self.regex):
                 char = self.regex[i]
-                if char in self.alphabet:
-                    language.add(char)
-                    if previous != self.dot and (
-                            previous in self.alphabet or previous in [self.closingBracket, self.star, "}"]):
+                if self.isLiteral(char):
+                    if previous != self.dot and self.endsOperand(previous):
                         self.addOperatorToStack(self.dot)
-                    self.automata.append(BuildAutomata.basicstruct(char))
+                    if self.utf8:
+                        self.pushStruct(("literal", True, char),
+                                        lambda: BuildAutomata.utf8RangeStruct([(ord(char), ord(char))]))
+                        language.update(self.automata[-1].language)
+                    else:
+                        language.add(char)
+                        self.pushStruct(("literal", False, char), lambda: BuildAutomata.basicstruct(char))
                     i += 1
                 elif char == self.epsilon:  # Handle epsilon transitions
-                    self.automata.append(BuildAutomata.epsilonStruct())
+                    self.pushStruct(("epsilon",), lambda: BuildAutomata.epsilonStruct())
                     i += 1
                 elif char == self.openingBracket:
-                    if previous != self.dot and (
-                            previous in self.alphabet or previous in [self.closingBracket, self.star, "}"]):
+                    if previous != self.dot and self.endsOperand(previous):
                         self.addOperatorToStack(self.dot)
                     self.stack.append(char)
+                    self.groups += 1
+                    self.groupstack.append(self.groups)
                     i += 1
                 elif char == self.closingBracket:
                     while len(self.stack) != 0 and self.stack[-1] != self.openingBracket:
                         op = self.stack.pop()
                         self.processOperator(op)
                     self.stack.pop()
+                    group = self.groupstack.pop()
+                    if self.captures:
+                        self.processGroup(group)
                     i += 1
                 elif char == self.plus:
                     while len(self.stack) != 0 and self.stack[-1] == self.dot:
@@ -77,6 +113,22 @@ class NFAfromRegex:
                         m = n
                     self.processRepetition(n, m)
                     i = end_brace + 1
+                    char = "}"  # The repetition completes an operand, so a following literal is concatenated
+                elif char == self.openingClass:
+                    end_class = self.regex.find(self.closingClass, i + 1)
+                    if end_class == -1:
+                        raise BaseException("Unmatched '[' in regex")
+                    if previous != self.dot and self.endsOperand(previous):
+                        self.addOperatorToStack(self.dot)
+                    ranges = self.parseClass(self.regex[i + 1:end_class])
+                    if self.utf8:
+                        key = ("class", True, tuple(ranges))
+                    else:
+                        key = ("class", False, frozenset(self.classChars(ranges)))
+                    self.pushStruct(key, lambda: self.buildClass(ranges))
+                    language.update(self.automata[-1].language)
+                    i = end_class + 1
+                    char = self.closingClass  # The class is a complete operand, like a closing bracket
                 else:
                     raise BaseException(f"Unsupported character '{char}' in regex")
 
@@ -88,11 +140,13 @@ class NFAfromRegex:
 
             if len(self.automata) > 1:
                 while len(self.automata) > 1:
-                    a = self.automata.pop()
-                    b = self.automata.pop()
-                    self.automata.append(BuildAutomata.dotstruct(b, a))
+                    [ida, a] = self.popStruct()
+                    [idb, b] = self.popStruct()
+                    self.pushStruct((self.dot, idb, ida), lambda: BuildAutomata.dotstruct(b, a))
 
-            self.nfa = self.automata.pop()
+            # The result may be a cache entry shared with other patterns, so hand out a copy
+            [termid, term] = self.popStruct()
+            self.nfa = term.copy()
             self.nfa.language = language
 
         except Exception as e:
@@ -112,29 +166,79 @@ class NFAfromRegex:
                 break
         self.stack.append(char)
 
+    def pushStruct(self, key, build):
+        """Push the automaton for the subexpression key, building it only if it is not cached yet."""
+        if key not in self.cache:
+            self.cache[key] = [len(self.cache), build()]
+        [termid, automaton] = self.cache[key]
+        self.terms.append(termid)
+        self.automata.append(automaton)
+
+    def popStruct(self):
+        return [self.terms.pop(), self.automata.pop()]
+
     def processOperator(self, operator):
         if len(self.automata) == 0:
             raise BaseException(f"Error processing operator '{operator}'. Stack is empty")
         if operator == self.star:
-            a = self.automata.pop()
-            self.automata.append(BuildAutomata.starstruct(a))
+            [ida, a] = self.popStruct()
+            self.pushStruct((self.star, ida), lambda: BuildAutomata.starstruct(a))
         elif operator in self.operators:
             if len(self.automata) < 2:
                 raise BaseException(f"Error processing operator '{operator}'. Inadequate operands")
-            a = self.automata.pop()
-            b = self.automata.pop()
+            [ida, a] = self.popStruct()
+            [idb, b] = self.popStruct()
             if operator == self.plus:
-                self.automata.append(BuildAutomata.plusstruct(b, a))
+                self.pushStruct((self.plus, idb, ida), lambda: BuildAutomata.plusstruct(b, a))
             elif operator == self.dot:
-                self.automata.append(BuildAutomata.dotstruct(b, a))
+                self.pushStruct((self.dot, idb, ida), lambda: BuildAutomata.dotstruct(b, a))
+
+    def processGroup(self, group):
+        if len(self.automata) == 0:
+            raise BaseException("Error processing group. Stack is empty")
+        [ida, a] = self.popStruct()
+        self.pushStruct(("group", ida, group), lambda: BuildAutomata.tagStruct(a, group))
+
+    def parseClass(self, content):
+        """Parse the inside of a character class such as 'a-z0' into code point ranges."""
+        if not content:
+            raise BaseException("Empty character class")
+        ranges = []
+        j = 0
+        while j < len(content):
+            if j + 2 < len(content) and content[j + 1] == "-":
+                lo, hi = ord(content[j]), ord(content[j + 2])
+                if lo > hi:
+                    raise BaseException(f"Invalid range '{content[j:j + 3]}' in character class")
+                ranges.append((lo, hi))
+                j += 3
+            else:
+                ranges.append((ord(content[j]), ord(content[j])))
+                j += 1
+        return ranges
+
+    def classChars(self, ranges):
+        chars = {char for char in self.alphabet if any(lo <= ord(char) <= hi for lo, hi in ranges)}
+        if not chars:
+            raise BaseException("Character class matches no character of the alphabet")
+        return chars
+
+    def buildClass(self, ranges):
+        if self.utf8:
+            return BuildAutomata.utf8RangeStruct(ranges)
+        chars = self.classChars(ranges)
+        struct = BuildAutomata.basicstruct(chars)
+        struct.language = chars
+        return struct
 
     def processRepetition(self, n, m):
         if len(self.automata) == 0:
             raise BaseException("Error processing repetition. Stack is empty")
-        a = self.automata.pop()
+        [ida, a] = self.popStruct()
+        key = ("{", ida, n, m)
         if n == m:
-            self.automata.append(BuildAutomata.exactRepetitionStruct(a, n))
+            self.pushStruct(key, lambda: BuildAutomata.exactRepetitionStruct(a, n))
         elif m == float('inf'):
-            self.automata.append(BuildAutomata.atLeastRepetitionStruct(a, n))
+            self.pushStruct(key, lambda: BuildAutomata.atLeastRepetitionStruct(a, n))
         else:
-            self.automata.append(BuildAutomata.rangeRepetitionStruct(a, n, m))
+            self.pushStruct(key, lambda: BuildAutomata.rangeRepetitionStruct(a, n, m))
@@ -0,0 +1,148 @@
+from collections import deque
+from nfa import Automata
+
+
+class ProductDFA:
+    """
+    Class for combining DFAs (e.g. the result of DFAfromNFA.getMinimisedDFA()) with the product construction.
+    Missing transitions are treated as going to an implicit dead state, represented here by None.
+    """
+
+    @staticmethod
+    def intersection(a, b):
+        return ProductDFA.product(a, b, lambda fa, fb: fa and fb)
+
+    @staticmethod
+    def union(a, b):
+        return ProductDFA.product(a, b, lambda fa, fb: fa or fb)
+
+    @staticmethod
+    def difference(a, b):
+        return ProductDFA.product(a, b, lambda fa, fb: fa and not fb)
+
+    @staticmethod
+    def complement(a, alphabet=None):
+        """
+        Build a DFA accepting every string over the alphabet (defaults to the DFA's language) that a rejects.
+        """
+        alphabet = set(alphabet) if alphabet is not None else set(a.language)
+        table = a.getTransitionTable()
+        finals = set(a.finalstates)
+        translations = {a.startstate: 1}
+        queue = deque([a.startstate])
+        complement = Automata(alphabet)
+        complement.setstartstate(1)
+
+        while queue:
+            state = queue.popleft()
+            if state not in finals:
+                complement.addfinalstates(translations[state])
+            for char in sorted(alphabet):
+                tostate = table[state].get(char) if state is not None else None
+                if tostate not in translations:
+                    translations[tostate] = len(translations) + 1
+                    queue.append(tostate)
+                complement.addtransition(translations[state], translations[tostate], char)
+        return complement
+
+    @staticmethod
+    def product(a, b, accept):
+        """
+        Build the reachable part of the product of a and b. A product state is final when
+        accept(a is final, b is final) holds. Pairs that can never become final are left out.
+        """
+        alphabet = set(a.language) | set(b.language)
+        tablea = a.getTransitionTable()
+        tableb = b.getTransitionTable()
+        finalsa = set(a.finalstates)
+        finalsb = set(b.finalstates)
+        # Whether a sink (missing transition) in one DFA can still lead to a final product state
+        deadcanaccepta = any(accept(False, fb) for fb in (False, True))
+        deadcanacceptb = any(accept(fa, False) for fa in (False, True))
+
+        start = (a.startstate, b.startstate)
+        translations = {start: 1}
+        queue = deque([start])
+        product = Automata(alphabet)
+        product.setstartstate(1)
+
+        while queue:
+            pair = queue.popleft()
+            sa, sb = pair
+            if accept(sa in finalsa, sb in finalsb):
+                product.addfinalstates(translations[pair])
+            for char in sorted(alphabet):
+                ta = tablea[sa].get(char) if sa is not None else None
+                tb = tableb[sb].get(char) if sb is not None else None
+                if (ta is None and tb is None) or (ta is None and not deadcanaccepta) or \
+                        (tb is None and not deadcanacceptb):
+                    continue
+                topair = (ta, tb)
+                if topair not in translations:
+                    translations[topair] = len(translations) + 1
+                    queue.append(topair)
+                product.addtransition(translations[pair], translations[topair], char)
+        return product
+
+    @staticmethod
+    def findWitness(a, b, accept):
+        """
+        Explore the product of a and b lazily (breadth first) and return the shortest string reaching
+        a pair for which accept(a is final, b is final) holds, or None if there is no such string.
+        """
+        alphabet = sorted(set(a.language) | set(b.language))
+        tablea = a.getTransitionTable()
+        tableb = b.getTransitionTable()
+        finalsa = set(a.finalstates)
+        finalsb = set(b.finalstates)
+
+        start = (a.startstate, b.startstate)
+        parents = {start: None}
+        queue = deque([start])
+
+        while queue:
+            pair = queue.popleft()
+            sa, sb = pair
+            if accept(sa in finalsa, sb in finalsb):
+                chars = []
+                while parents[pair] is not None:
+                    pair, char = parents[pair]
+                    chars.append(char)
+                return a.spell(chars[::-1]) if a.language else b.spell(chars[::-1])
+            for char in alphabet:
+                ta = tablea[sa].get(char) if sa is not None else None
+                tb = tableb[sb].get(char) if sb is not None else None
+                if ta is None and tb is None:
+                    continue
+                topair = (ta, tb)
+                if topair not in parents:
+                    parents[topair] = (pair, char)
+                    queue.append(topair)
+        return None
+
+    @staticmethod
+    def counterexample(a, b):
+        """Return the shortest string accepted by exactly one of a and b, or None if they are equivalent."""
+        return ProductDFA.findWitness(a, b, lambda fa, fb: fa != fb)
+
+    @staticmethod
+    def inclusionCounterexample(a, b):
+        """Return the shortest string accepted by a but not by b, or None if L(a) is contained in L(b)."""
+        return ProductDFA.findWitness(a, b, lambda fa, fb: fa and not fb)
+
+    @staticmethod
+    def overlapWitness(a, b):
+        """Return the shortest string accepted by both a and b, or None if their languages are disjoint."""
+        return ProductDFA.findWitness(a, b, lambda fa, fb: fa and fb)
+
+    @staticmethod
+    def isEquivalent(a, b):
+        return ProductDFA.counterexample(a, b) is None
+
+    @staticmethod
+    def isSubset(a, b):
+        return ProductDFA.inclusionCounterexample(a, b) is None
+
+    @staticmethod
+    def overlaps(a, b):
+        return ProductDFA.overlapWitness(a, b) is not None
@@ -0,0 +1,165 @@
+from collections import deque
+from nfa import Automata
+
+
+class NFAReducer:
+    """
+    Optional pass between NFAfromRegex.getNFA() and DFAfromNFA that shrinks a Thompson NFA:
+    epsilon transitions are removed, states that are unreachable or cannot reach a final state are
+    trimmed, and states that are forward or backward bisimilar are merged. The language is unchanged.
+
+    The reduced NFA may have several final states, so it is meant to be passed to DFAfromNFA
+    rather than combined further with BuildAutomata.
+    """
+
+    def __init__(self, nfa):
+        self.nfa = nfa
+        self.reducedNFA = None
+        self.stats = {"states": [len(nfa.states), None], "edges": [self.countEdges(nfa), None]}
+        self.reduce()
+
+    def getReducedNFA(self):
+        return self.reducedNFA
+
+    def getStats(self):
+        """Return {"states": [before, after], "edges": [before, after]}."""
+        return self.stats
+
+    def displayStats(self):
+        print(f"States: {self.stats['states'][0]} -> {self.stats['states'][1]}")
+        print(f"Edges: {self.stats['edges'][0]} -> {self.stats['edges'][1]}")
+
+    def displayReducedNFA(self):
+        self.reducedNFA.display()
+
+    def reduce(self):
+        reduced = self.removeEpsilons(self.nfa)
+        reduced = self.trim(reduced)
+        while True:
+            size = len(reduced.states)
+            reduced = self.mergeBisimilar(reduced, forward=True)
+            reduced = self.mergeBisimilar(reduced, forward=False)
+            if len(reduced.states) == size:
+                break
+        self.reducedNFA = self.renumber(reduced)
+        self.stats["states"][1] = len(self.reducedNFA.states)
+        self.stats["edges"][1] = self.countEdges(self.reducedNFA)
+
+    @staticmethod
+    def countEdges(nfa):
+        return sum(len(chars) for tostates in nfa.transitions.values() for chars in tostates.values())
+
+    def removeEpsilons(self, nfa):
+        """
+        Give every state the non-epsilon transitions of its epsilon closure, and make it final if the
+        closure contains a final state. Only the start state and targets of non-epsilon transitions are kept.
+        """
+        closures = nfa.getEClosures()
+        finalbits = nfa.statesToBits(nfa.finalstates)
+        result = Automata(nfa.language)
+        result.setstartstate(nfa.startstate)
+        queue = deque([nfa.startstate])
+        seen = {nfa.startstate}
+
+        while queue:
+            state = queue.popleft()
+            if closures[state] & finalbits:
+                result.addfinalstates(state)
+            for s in nfa.bitsToStates(closures[state]):
+                for tostate, chars in nfa.transitions[s].items():
+                    # Epsilon and tags are dropped, but characters that share their label set are still moves
+                    symbols = {char for char in chars if char != Automata.epsilon() and Automata.tagIndex(char) is None}
+                    if not symbols:
+                        continue
+                    result.addtransition(state, tostate, symbols)
+                    if tostate not in seen:
+                        seen.add(tostate)
+                        queue.append(tostate)
+        return result
+
+    def trim(self, nfa):
+        """Drop the states that cannot reach a final state (the start state is always kept)."""
+        predecessors = {state: set() for state in nfa.states}
+        for fromstate, tostates in nfa.transitions.items():
+            for tostate in tostates:
+                predecessors[tostate].add(fromstate)
+        live = set(nfa.finalstates)
+        stack = list(nfa.finalstates)
+        while stack:
+            for state in predecessors[stack.pop()]:
+                if state not in live:
+                    live.add(state)
+                    stack.append(state)
+
+        result = Automata(nfa.language)
+        result.setstartstate(nfa.startstate)
+        result.addfinalstates(nfa.finalstates)
+        for fromstate, tostates in nfa.transitions.items():
+            if fromstate not in live:
+                continue
+            for tostate, chars in tostates.items():
+                if tostate in live:
+                    result.addtransition(fromstate, tostate, set(chars))
+        return result
+
+    def mergeBisimilar(self, nfa, forward=True):
+        """
+        Merge states by partition refinement. Forward bisimilar states agree on being final and have
+        matching transitions into the same blocks; backward bisimilar states agree on being the start
+        state and have matching transitions from the same blocks.
+        """
+        edges = {state: [] for state in nfa.states}
+        for fromstate, tostates in nfa.transitions.items():
+            for tostate, chars in tostates.items():
+                for char in chars:
+                    if forward:
+                        edges[fromstate].append((char, tostate))
+                    else:
+                        edges[tostate].append((char, fromstate))
+
+        if forward:
+            marked = set(nfa.finalstates)
+        else:
+            marked = {nfa.startstate}
+        block = {state: int(state in marked) for state in nfa.states}
+        count = len(set(block.values()))
+
+        while True:
+            signatures = {}
+            newblock = {}
+            for state in sorted(nfa.states):
+                signature = (block[state], frozenset((char, block[other]) for char, other in edges[state]))
+                if signature not in signatures:
+                    signatures[signature] = len(signatures)
+                newblock[state] = signatures[signature]
+            block = newblock
+            if len(signatures) == count:
+                break
+            count = len(signatures)
+
+        result = Automata(nfa.language)
+        result.setstartstate(block[nfa.startstate])
+        result.addfinalstates([block[s] for s in nfa.finalstates])
+        for fromstate, tostates in nfa.transitions.items():
+            for tostate, chars in tostates.items():
+                result.addtransition(block[fromstate], block[tostate], set(chars))
+        return result
+
+    def renumber(self, nfa):
+        """Number the states 1, 2, ... in breadth-first order from the start state."""
+        translations = {nfa.startstate: 1}
+        queue = deque([nfa.startstate])
+        while queue:
+            state = queue.popleft()
+            for tostate in sorted(nfa.transitions[state]):
+                if tostate not in translations:
+                    translations[tostate] = len(translations) + 1
+                    queue.append(tostate)
+
+        result = Automata(nfa.language)
+        result.setstartstate(1)
+        result.addfinalstates(sorted(translations[s] for s in nfa.finalstates if s in translations))
+        for fromstate, tostates in nfa.transitions.items():
+            for tostate, chars in tostates.items():
+                result.addtransition(translations[fromstate], translations[tostate], set(chars))
+        return result
@@ -0,0 +1,88 @@
+from stream import Match
+
+
+class DFASearcher:
+    """
+    Class for finding the leftmost-longest, non-overlapping match spans of a compiled regex
+    (a DFAfromNFA object).
+
+    One backward pass with the reversed unanchored DFA marks every position where a match starts.
+    Each match then takes the next marked start and runs the anchored minimised DFA forward from it,
+    keeping the last accepting position, until the DFA dies. The forward runs record the longest end
+    reachable from every (position, state) pair they visit, so a later run that reaches a visited pair
+    stops there instead of reading the same look-ahead again. Every pair is expanded at most once,
+    so finditer is O(n * k) for n characters and k DFA states.
+    """
+
+    def __init__(self, dfaObj):
+        forward = dfaObj.getMinimisedDFA()
+        reverse = dfaObj.getReversedUnanchoredDFA()
+        self.forwardtable = forward.getTransitionTable()
+        self.forwardstart = forward.startstate
+        self.forwardfinals = set(forward.finalstates)
+        self.reversetable = reverse.getTransitionTable()
+        self.reversestart = reverse.startstate
+        self.reversefinals = set(reverse.finalstates)
+
+    def finditer(self, text):
+        """Yield a Match(start, end) for every non-overlapping leftmost-longest match, left to right."""
+        starts = self.findStarts(text)
+        longest = {}
+        pos = 0
+        while pos <= len(text):
+            start = starts.find(1, pos)
+            if start == -1:
+                return
+            end = self.findLongestEnd(text, start, longest)
+            yield Match(start, end)
+            # Step over empty matches so the scan always makes progress
+            pos = end if end > start else end + 1
+
+    def search(self, text):
+        """Return the first Match in text, or None."""
+        return next(self.finditer(text), None)
+
+    def findStarts(self, text):
+        """Return a bytearray with starts[i] == 1 exactly when a match of the regex starts at i."""
+        table = self.reversetable
+        finals = self.reversefinals
+        state = self.reversestart
+        starts = bytearray(len(text) + 1)
+        starts[len(text)] = state in finals
+        for i in range(len(text) - 1, -1, -1):
+            # Characters outside the language cannot be part of a match, so the scan restarts after them
+            state = table[state].get(text[i], self.reversestart)
+            starts[i] = state in finals
+        return starts
+
+    def findLongestEnd(self, text, start, longest=None):
+        """
+        Return the largest end such that text[start:end] is accepted, or None.
+        longest maps (position, state) to the longest end reachable from that pair; it is filled in
+        along the way and may be shared between calls on the same text.
+        """
+        longest = longest if longest is not None else {}
+        table = self.forwardtable
+        finals = self.forwardfinals
+        state = self.forwardstart
+        path = []
+        end = None
+        i = start
+        while True:
+            if (i, state) in longest:
+                end = longest[(i, state)]
+                break
+            path.append((i, state))
+            if i == len(text):
+                break
+            state = table[state].get(text[i])
+            if state is None:
+                break
+            i += 1
+
+        # An accepting pair only ends the match if nothing further along the path accepts
+        for i, state in reversed(path):
+            if end is None and state in finals:
+                end = i
+            longest[(i, state)] = end
+        return end
@@ -0,0 +1,200 @@
+import sys
+from array import array
+from collections import Counter
+
+
+def compactArray(values):
+    """Store non-negative ints in the smallest array type that holds them."""
+    largest = max(values, default=0)
+    for typecode in "BHIL":
+        if largest < 1 << (8 * array(typecode).itemsize):
+            return array(typecode, values)
+    return array("Q", values)
+
+
+def deepSize(obj, seen=None):
+    """Approximate memory used by an object and everything it contains."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deepSize(k, seen) + deepSize(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deepSize(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deepSize(vars(obj), seen)
+    return size
+
+
+class TransitionStorage:
+    """
+    Base class for compact transition tables of a DFA (e.g. the result of DFAfromNFA.getMinimisedDFA()).
+    States are renumbered 1..k with the start state as 1; 0 is the dead state. Symbols are mapped to
+    columns 0..m-1. Subclasses implement:
+        build(rows)               - store rows[state][column] = target, with row 0 for the dead state
+        nextState(state, column)  - return the target in O(1)
+        tables()                  - return the objects that make up the stored table, for getMemorySize()
+    """
+
+    name = None
+
+    def __init__(self, dfa):
+        self.startstate = 1
+        translations = {dfa.startstate: 1}
+        for state in sorted(dfa.states):
+            if state not in translations:
+                translations[state] = len(translations) + 1
+        table = dfa.getTransitionTable()
+        symbols = sorted({char for row in table.values() for char in row})
+        self.columns = {char: i for i, char in enumerate(symbols)}
+        self.statecount = len(translations)
+        self.finals = compactArray([0] * (self.statecount + 1))
+        for s in dfa.finalstates:
+            self.finals[translations[s]] = 1
+
+        # rows[state][column] = target, with row 0 for the dead state
+        rows = [[0] * len(symbols) for _ in range(self.statecount + 1)]
+        for state, row in table.items():
+            for char, tostate in row.items():
+                rows[translations[state]][self.columns[char]] = translations[tostate]
+        self.build(rows)
+
+    def getMemorySize(self):
+        return sum(deepSize(table) for table in [self.columns, self.finals] + self.tables())
+
+    def match(self, text):
+        state = self.startstate
+        columns = self.columns
+        for char in text:
+            column = columns.get(char)
+            if column is None:
+                return False
+            state = self.nextState(state, column)
+            if state == 0:
+                return False
+        return self.finals[state] == 1
+
+
+class DenseTable(TransitionStorage):
+    """Full state x symbol table in one flat array."""
+
+    name = "dense"
+
+    def build(self, rows):
+        self.width = len(self.columns)
+        self.table = compactArray([tostate for row in rows for tostate in row])
+
+    def nextState(self, state, column):
+        return self.table[state * self.width + column]
+
+    def tables(self):
+        return [self.table]
+
+
+class DedupTable(TransitionStorage):
+    """Identical rows are stored once; every state points at its row."""
+
+    name = "dedup"
+
+    def build(self, rows):
+        self.width = len(self.columns)
+        unique = {}
+        rowof = []
+        for row in rows:
+            rowof.append(unique.setdefault(tuple(row), len(unique)))
+        self.rowof = compactArray(rowof)
+        self.table = compactArray([tostate for row in unique for tostate in row])
+
+    def nextState(self, state, column):
+        return self.table[self.rowof[state] * self.width + column]
+
+    def tables(self):
+        return [self.rowof, self.table]
+
+
+class DefaultTable(TransitionStorage):
+    """Every state has a default target (its most common one) plus a hash table of exceptions."""
+
+    name = "default"
+
+    def build(self, rows):
+        self.width = len(self.columns)
+        defaults = []
+        self.exceptions = {}
+        for state, row in enumerate(rows):
+            default = Counter(row).most_common(1)[0][0] if row else 0
+            defaults.append(default)
+            for column, tostate in enumerate(row):
+                if tostate != default:
+                    self.exceptions[state * self.width + column] = tostate
+        self.defaults = compactArray(defaults)
+
+    def nextState(self, state, column):
+        return self.exceptions.get(state * self.width + column, self.defaults[state])
+
+    def tables(self):
+        return [self.defaults, self.exceptions]
+
+
+class CombTable(TransitionStorage):
+    """
+    Row-displacement (comb-vector) table as used by yacc and flex. Identical rows are stored once and
+    every row keeps a default target. The remaining entries of all rows are packed into one array at
+    per-row offsets, with a check array recording which row owns each slot.
+    """
+
+    name = "comb"
+
+    def build(self, rows):
+        unique = {}
+        rowof = []
+        for row in rows:
+            rowof.append(unique.setdefault(tuple(row), len(unique)))
+        self.rowof = compactArray(rowof)
+
+        defaults = [0] * len(unique)
+        entries = {}
+        for row, index in unique.items():
+            defaults[index] = Counter(row).most_common(1)[0][0] if row else 0
+            entries[index] = [(column, tostate) for column, tostate in enumerate(row) if tostate != defaults[index]]
+
+        # Place the densest rows first, each at the lowest offset where its entries fit
+        nexts = []
+        checks = []
+        bases = [0] * len(unique)
+        for index in sorted(entries, key=lambda i: -len(entries[i])):
+            base = 0
+            while any(base + column < len(checks) and checks[base + column] != 0 for column, _ in entries[index]):
+                base += 1
+            for column, tostate in entries[index]:
+                while len(checks) <= base + column:
+                    checks.append(0)
+                    nexts.append(0)
+                checks[base + column] = index + 1  # 0 marks a free slot
+                nexts[base + column] = tostate
+            bases[index] = base
+
+        self.defaults = compactArray(defaults)
+        self.bases = compactArray(bases)
+        self.nexts = compactArray(nexts)
+        self.checks = compactArray(checks)
+
+    def nextState(self, state, column):
+        row = self.rowof[state]
+        slot = self.bases[row] + column
+        if slot < len(self.checks) and self.checks[slot] == row + 1:
+            return self.nexts[slot]
+        return self.defaults[row]
+
+    def tables(self):
+        return [self.rowof, self.defaults, self.bases, self.nexts, self.checks]
+
+
+def compareStorage(dfa):
+    """Return {format name: memory in bytes}, including the Automata dict-of-dicts-of-sets itself."""
+    sizes = {"automata": deepSize(dfa.transitions)}
+    for storage in (DenseTable, DedupTable, DefaultTable, CombTable):
+        sizes[storage.name] = storage(dfa).getMemorySize()
+    return sizes
@@ -0,0 +1,130 @@
+import asyncio
+import codecs
+from collections import namedtuple
+
+Match = namedtuple("Match", ["start", "end"])
+
+
+class StreamMatcher:
+    """
+    Class for matching a DFA (e.g. the result of DFAfromNFA.getMinimisedDFA()) incrementally
+    against input that arrives in chunks.
+
+    Every offset at which a non-empty match ends is reported as a Match(start, end), where start is
+    the leftmost offset such that input[start:end] is accepted. Offsets are absolute positions in the
+    whole stream, so matches may span chunk boundaries.
+
+    Byte chunks are decoded with the given encoding, and offsets are still byte offsets into the raw
+    stream. Invalid bytes are handled with the decoder error mode errors; with the default
+    "surrogateescape" each one becomes a character that no DFA accepts, so it only ends the matches
+    in progress. Pass encoding=None to feed str chunks as they are (offsets are then character offsets).
+    A byte-level DFA (NFAfromRegex(..., utf8=True)) reads bytes/memoryview chunks as they are, so the
+    encoding is ignored.
+    """
+
+    def __init__(self, dfa, encoding="utf-8", errors="surrogateescape"):
+        self.table = dfa.getTransitionTable()
+        self.startstate = dfa.startstate
+        self.finalstates = set(dfa.finalstates)
+        self.decoder = None
+        self.width = None
+        if encoding and not any(isinstance(char, int) for char in dfa.language):
+            self.decoder = codecs.getincrementaldecoder(encoding)(errors)
+            if codecs.lookup(encoding).name == "utf-8":
+                self.width = utf8Width
+            else:
+                encoder = codecs.getincrementalencoder(encoding)(errors)
+                self.width = lambda char: len(encoder.encode(char))
+        self.offset = 0
+        self.threads = {}  # DFA state -> leftmost start offset that reaches it
+        self.finished = False
+        self.fullmatch = False
+
+    def feed(self, chunk):
+        """Consume the next chunk and return the matches ending inside it."""
+        if self.finished:
+            raise ValueError("Cannot feed a StreamMatcher after finish()")
+        if self.decoder:
+            chunk = self.decoder.decode(chunk)
+        return self.scan(chunk)
+
+    def finish(self):
+        """
+        Signal the end of the stream and return any remaining matches.
+        Afterwards self.fullmatch tells whether the whole stream was accepted.
+        """
+        events = []
+        if self.decoder:
+            events = self.scan(self.decoder.decode(b"", final=True))
+        self.finished = True
+        if self.offset == 0:
+            self.fullmatch = self.startstate in self.finalstates
+        else:
+            self.fullmatch = any(begin == 0 and state in self.finalstates for state, begin in self.threads.items())
+        return events
+
+    def scan(self, text):
+        events = []
+        table = self.table
+        finalstates = self.finalstates
+        threads = self.threads
+        offset = self.offset
+        width = self.width
+
+        for char in text:
+            # A new match can start at every offset; an earlier start on the same state always wins
+            if self.startstate not in threads:
+                threads[self.startstate] = offset
+            advanced = {}
+            for state, begin in threads.items():
+                tostate = table[state].get(char)
+                if tostate is not None and (tostate not in advanced or begin < advanced[tostate]):
+                    advanced[tostate] = begin
+            threads = advanced
+            offset += width(char) if width else 1
+            starts = [begin for state, begin in threads.items() if state in finalstates]
+            if starts:
+                events.append(Match(min(starts), offset))
+
+        self.threads = threads
+        self.offset = offset
+        return events
+
+
+def utf8Width(char):
+    """Return the number of bytes char took in UTF-8 input decoded with errors="surrogateescape"."""
+    code = ord(char)
+    if code < 0x80 or 0xDC80 <= code <= 0xDCFF:  # An escaped invalid byte stands for a single byte
+        return 1
+    if code < 0x800:
+        return 2
+    if code < 0x10000:
+        return 3
+    return 4
+
+
+async def matchStream(dfa, source, encoding="utf-8", chunksize=65536, errors="surrogateescape"):
+    """
+    Asynchronously yield the matches of dfa in source, which is either an asyncio.StreamReader
+    (anything with an awaitable read()) or an async iterator of byte chunks.
+    Control is handed back to the event loop after every chunk.
+    """
+    matcher = StreamMatcher(dfa, encoding, errors)
+
+    async def chunks():
+        if hasattr(source, "read"):
+            while True:
+                chunk = await source.read(chunksize)
+                if not chunk:
+                    break
+                yield chunk
+        else:
+            async for chunk in source:
+                yield chunk
+
+    async for chunk in chunks():
+        for event in matcher.feed(chunk):
+            yield event
+        await asyncio.sleep(0)
+    for event in matcher.finish():
+        yield event
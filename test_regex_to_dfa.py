@@ -1,6 +1,22 @@
+import asyncio
+import collections
+import importlib.util
+import itertools
+import os
+import random
+import tempfile
 import unittest
-from dfa import DFAfromNFA
+from unittest import mock
+from codegen import DFACodeGenerator
+from counting import DFALanguage
+from dfa import DFAfromNFA, TaggedDFAfromNFA
+from nfa import Automata
 from parser import NFAfromRegex
+from product import ProductDFA
+from reduction import NFAReducer
+from search import DFASearcher
+from storage import CombTable, DedupTable, DefaultTable, DenseTable, compareStorage
+from stream import Match, StreamMatcher, matchStream
 
 
 class TestRegexToDFA(unittest.TestCase):
@@ -340,5 +356,434 @@ class TestRegexToDFA(unittest.TestCase):
                                      expected_final_states)
 
         self.repeat_test(inner_test)
+
+
+def buildDFA(regex, alphabet=None, construction=DFAfromNFA, **options):
+    """Compile regex with NFAfromRegex(regex, alphabet, **options) and pass the NFA to construction."""
+    nfa = NFAfromRegex(regex, alphabet, **options).getNFA()
+    return construction(nfa, alphabet)
+
+
+def minDFA(regex, alphabet=None, **options):
+    return buildDFA(regex, alphabet, **options).getMinimisedDFA()
+
+
+class TestProductDFA(unittest.TestCase):
+
+    def accepts(self, dfa, string):
+        table = dfa.getTransitionTable()
+        state = dfa.startstate
+        for char in string:
+            state = table[state].get(char)
+            if state is None:
+                return False
+        return state in dfa.finalstates
+
+    def test_equivalent_patterns(self):
+        alphabet = ["a", "b", "c"]
+        a = minDFA("(a+b)*", alphabet)
+        b = minDFA("(a*b*)*", alphabet)
+        self.assertTrue(ProductDFA.isEquivalent(a, b))
+        self.assertIsNone(ProductDFA.counterexample(a, b))
+
+    def test_counterexample_is_shortest(self):
+        alphabet = ["a", "b"]
+        a = minDFA("a*b", alphabet)
+        b = minDFA("aa*b", alphabet)
+        self.assertFalse(ProductDFA.isEquivalent(a, b))
+        self.assertEqual(ProductDFA.counterexample(a, b), "b")
+        self.assertTrue(ProductDFA.isSubset(b, a))
+        self.assertEqual(ProductDFA.inclusionCounterexample(a, b), "b")
+
+    def test_overlap(self):
+        alphabet = ["a", "b", "c"]
+        a = minDFA("a*b", alphabet)
+        b = minDFA("ab+c", alphabet)
+        c = minDFA("c*", alphabet)
+        self.assertEqual(ProductDFA.overlapWitness(a, b), "ab")
+        self.assertFalse(ProductDFA.overlaps(a, c))
+
+    def test_product_operations(self):
+        alphabet = ["a", "b"]
+        a = minDFA("a*b", alphabet)
+        b = minDFA("ab+b", alphabet)
+        intersection = ProductDFA.intersection(a, b)
+        union = ProductDFA.union(a, b)
+        difference = ProductDFA.difference(a, b)
+        complement = ProductDFA.complement(a)
+        for string in ["", "a", "b", "ab", "aab", "ba", "abb"]:
+            ina, inb = self.accepts(a, string), self.accepts(b, string)
+            self.assertEqual(self.accepts(intersection, string), ina and inb, string)
+            self.assertEqual(self.accepts(union, string), ina or inb, string)
+            self.assertEqual(self.accepts(difference, string), ina and not inb, string)
+            self.assertEqual(self.accepts(complement, string), not ina, string)
+
+
+class TestDFALanguage(unittest.TestCase):
+
+    def test_count(self):
+        language = DFALanguage(minDFA("(a+b)*c", ["a", "b", "c"]))
+        self.assertEqual([language.count(n) for n in range(5)], [0, 1, 2, 4, 8])
+        self.assertEqual(language.count(201), 2 ** 200)
+        self.assertEqual(language.countByMatrixPower(3), language.count(3))
+
+    def test_enumerate_shortlex(self):
+        language = DFALanguage(minDFA("a*b+c", ["a", "b", "c"]))
+        strings = []
+        for string in language.enumerate():
+            strings.append(string)
+            if len(strings) == 5:
+                break
+        self.assertEqual(strings, ["b", "c", "ab", "aab", "aaab"])
+
+    def test_enumerate_finite_language(self):
+        language = DFALanguage(minDFA("(a+b)(c+d)", ["a", "b", "c", "d"]))
+        self.assertEqual(list(language.enumerate()), ["ac", "ad", "bc", "bd"])
+
+    def test_sample(self):
+        language = DFALanguage(minDFA("(a+b)*c", ["a", "b", "c"]))
+        rng = random.Random(0)
+        for _ in range(20):
+            string = language.sample(4, rng)
+            self.assertEqual(len(string), 4)
+            self.assertTrue(string.endswith("c") and "c" not in string[:-1])
+        with self.assertRaises(ValueError):
+            DFALanguage(minDFA("ab", ["a", "b"])).sample(3)
+
+
+class TestDFACodeGenerator(unittest.TestCase):
+
+    def test_generated_matchers(self):
+        dfa = minDFA("(ab+c)*d", ["a", "b", "c", "d"])
+        for style in DFACodeGenerator.styles:
+            match = DFACodeGenerator(dfa, style).compile()
+            for string in ["d", "abd", "cabcd", "abcabd"]:
+                self.assertTrue(match(string), (style, string))
+            for string in ["", "ab", "ad", "dd", "abxd"]:
+                self.assertFalse(match(string), (style, string))
+
+    def test_compiled_matchers_are_cached(self):
+        dfa = minDFA("a*b", ["a", "b"])
+        self.assertIs(DFACodeGenerator(dfa, "dispatch").compile(), DFACodeGenerator(dfa, "dispatch").compile())
+
+    def test_compiled_cache_is_bounded(self):
+        dfas = [minDFA(regex, ["a", "b"]) for regex in ["a", "b", "ab"]]
+        with mock.patch.object(DFACodeGenerator, "compiled", collections.OrderedDict()), \
+                mock.patch.object(DFACodeGenerator, "cachesize", 2):
+            first = DFACodeGenerator(dfas[0]).compile()
+            DFACodeGenerator(dfas[1]).compile()
+            self.assertIs(DFACodeGenerator(dfas[0]).compile(), first)  # Now the most recently used
+            DFACodeGenerator(dfas[2]).compile()
+            self.assertEqual(len(DFACodeGenerator.compiled), 2)
+            self.assertIs(DFACodeGenerator(dfas[0]).compile(), first)
+            self.assertNotIn(DFACodeGenerator(dfas[1]).getSource(), DFACodeGenerator.compiled)
+
+    def test_invalid_function_name(self):
+        dfa = minDFA("a*b", ["a", "b"])
+        for name in ["", "1match", "match(text):\n    pass\ndef x", "class"]:
+            with self.assertRaises(ValueError):
+                DFACodeGenerator(dfa, name=name)
+
+    def test_write_importable_module(self):
+        dfa = minDFA("a*b", ["a", "b"])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "a_star_b.py")
+            DFACodeGenerator(dfa, name="fullmatch").writeModule(path)
+            spec = importlib.util.spec_from_file_location("a_star_b", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        self.assertTrue(module.fullmatch("aab"))
+        self.assertFalse(module.fullmatch("aba"))
+
+
+class TestStreamMatcher(unittest.TestCase):
+
+    def test_matches_across_chunks(self):
+        matcher = StreamMatcher(minDFA("ab*c", ["a", "b", "c"]))
+        events = matcher.feed(b"xxab") + matcher.feed(b"bc") + matcher.feed(b"ac") + matcher.finish()
+        self.assertEqual(events, [Match(2, 6), Match(6, 8)])
+        self.assertFalse(matcher.fullmatch)
+
+    def test_split_multibyte_character(self):
+        matcher = StreamMatcher(minDFA("\u00e9\u00e9", ["\u00e9"]))
+        data = "\u00e9\u00e9".encode("utf-8")
+        events = [event for i in range(len(data)) for event in matcher.feed(data[i:i + 1])] + matcher.finish()
+        self.assertEqual(events, [Match(0, 4)])
+        self.assertTrue(matcher.fullmatch)
+
+    def test_byte_offsets_and_invalid_bytes(self):
+        matcher = StreamMatcher(minDFA("ab", ["a", "b"]))
+        events = matcher.feed("\u00e9".encode("utf-8") + b"ab") + matcher.feed(b"\xffab\xff") + matcher.finish()
+        self.assertEqual(events, [Match(2, 4), Match(5, 7)])
+
+    def test_async_stream_reader(self):
+        dfa = minDFA("ab", ["a", "b"])
+
+        async def collect():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b"abxab")
+            reader.feed_eof()
+            return [event async for event in matchStream(dfa, reader, chunksize=2)]
+
+        self.assertEqual(asyncio.run(collect()), [Match(0, 2), Match(3, 5)])
+
+
+class TestDFASearcher(unittest.TestCase):
+
+    def test_reversed_dfa(self):
+        nfa = NFAfromRegex("ab*c", ["a", "b", "c"]).getNFA()
+        reverse = DFAfromNFA(nfa, ["a", "b", "c"]).getReversedDFA()
+        self.assertTrue(ProductDFA.isEquivalent(reverse, minDFA("cb*a", ["a", "b", "c"])))
+
+    def test_finditer(self):
+        searcher = DFASearcher(buildDFA("ab*c", ["a", "b", "c"]))
+        self.assertEqual(list(searcher.finditer("xabbcacbac")), [Match(1, 5), Match(5, 7), Match(8, 10)])
+        self.assertIsNone(searcher.search("abbb"))
+
+    def test_leftmost_longest(self):
+        self.assertEqual(list(DFASearcher(buildDFA("a*b", ["a", "b"])).finditer("aabxb")), [Match(0, 3), Match(4, 5)])
+        self.assertEqual(list(DFASearcher(buildDFA("ab*", ["a", "b"])).finditer("abbb")), [Match(0, 4)])
+        # The leftmost match ends after the earliest-ending one
+        self.assertEqual(list(DFASearcher(buildDFA("abc+b", ["a", "b", "c"])).finditer("abc")), [Match(0, 3)])
+
+    def test_empty_matches(self):
+        searcher = DFASearcher(buildDFA("a*", ["a"]))
+        self.assertEqual(list(searcher.finditer("aaa")), [Match(0, 3), Match(3, 3)])
+        self.assertEqual(list(searcher.finditer("xa")), [Match(0, 0), Match(1, 2), Match(2, 2)])
+
+    def test_look_ahead_is_read_once(self):
+        class CountingText(str):
+            reads = 0
+
+            def __getitem__(self, index):
+                CountingText.reads += 1
+                return str.__getitem__(self, index)
+
+        # Every position starts a match whose end is only known after reading to the end of the text
+        text = CountingText("a" * 1000)
+        matches = list(DFASearcher(buildDFA("a+aa*b", ["a", "b"])).finditer(text))
+        self.assertEqual(matches, [Match(i, i + 1) for i in range(1000)])
+        self.assertLess(CountingText.reads, 5 * len(text))
+
+    def test_matches_brute_force_reference(self):
+        def reference(regex, text):
+            spans = []
+            pos = 0
+            while pos <= len(text):
+                for start in range(pos, len(text) + 1):
+                    ends = [end for end in range(start, len(text) + 1) if match(text[start:end])]
+                    if ends:
+                        break
+                else:
+                    return spans
+                spans.append((start, max(ends)))
+                pos = max(ends) if max(ends) > start else max(ends) + 1
+            return spans
+
+        alphabet = ["a", "b", "c"]
+        for regex in ["ab*", "a*", "abc+b", "(ab+a)(bc+c)*", "a(b+c)*a+b"]:
+            dfaObj = buildDFA(regex, alphabet)
+            match = DFACodeGenerator(dfaObj.getMinimisedDFA()).compile()
+            searcher = DFASearcher(dfaObj)
+            for length in range(6):
+                for chars in itertools.product("abcx", repeat=length):
+                    text = "".join(chars)
+                    self.assertEqual([tuple(m) for m in searcher.finditer(text)], reference(regex, text),
+                                     (regex, text))
+
+
+class TestEpsilonClosures(unittest.TestCase):
+
+    def test_closures_share_components(self):
+        nfa = Automata()
+        nfa.setstartstate(1)
+        nfa.addtransition(1, 2, Automata.epsilon())
+        nfa.addtransition(2, 3, Automata.epsilon())
+        nfa.addtransition(3, 1, Automata.epsilon())
+        nfa.addtransition(3, 4, Automata.epsilon())
+        nfa.addtransition(4, 5, "a")
+        nfa.addfinalstates(5)
+        closures = nfa.getEClosures()
+        self.assertIs(closures[1], closures[3])
+        self.assertEqual(nfa.getEClose(2), {1, 2, 3, 4})
+        self.assertEqual(nfa.getEClose(4), {4})
+        self.assertEqual(nfa.getEClose(5), {5})
+
+    def test_closures_reset_on_change(self):
+        nfa = Automata()
+        nfa.setstartstate(1)
+        nfa.addtransition(1, 2, "a")
+        self.assertEqual(nfa.getEClose(1), {1})
+        nfa.addtransition(1, 3, Automata.epsilon())
+        self.assertEqual(nfa.getEClose(1), {1, 3})
+
+
+class TestUTF8Automata(unittest.TestCase):
+
+    def test_utf8_sequences_cover_range(self):
+        lo, hi = 0x7E0, 0x820
+        match = DFACodeGenerator(minDFA("[\u07e0-\u0820]", utf8=True)).compile()
+        for cp in range(lo - 0x40, hi + 0x40):
+            self.assertEqual(match(chr(cp).encode("utf-8")), lo <= cp <= hi, hex(cp))
+
+    def test_full_range_rejects_invalid_utf8(self):
+        match = DFACodeGenerator(minDFA("[\x00-\U0010ffff]*", utf8=True)).compile()
+        self.assertTrue(match("a\u00e9\u4e2d\U0001f600".encode("utf-8")))
+        self.assertTrue(match(memoryview("\u00e9\u00e9".encode("utf-8"))))
+        for invalid in [b"\xc0\x80", b"\xed\xa0\x80", b"\xe4\xb8", b"\x80", b"\xf4\x90\x80\x80"]:
+            self.assertFalse(match(invalid), invalid)
+
+    def test_unicode_literals_and_byte_classes(self):
+        nfa = NFAfromRegex("\u00e9t\u00e9+[\u03b1-\u03c9][\u03b1-\u03c9]*", utf8=True).getNFA()
+        dfaObj = DFAfromNFA(nfa)
+        self.assertLess(len(dfaObj.getSymbolClasses()), len(nfa.language))
+        searcher = DFASearcher(dfaObj)
+        data = "x \u00e9t\u00e9 \u03b1\u03b2".encode("utf-8")
+        self.assertEqual([data[m.start:m.end].decode("utf-8") for m in searcher.finditer(data)],
+                         ["\u00e9t\u00e9", "\u03b1\u03b2"])
+
+    def test_enumerate_bytes(self):
+        language = DFALanguage(minDFA("\u00e9+a", utf8=True))
+        self.assertEqual(list(language.enumerate()), [b"a", "\u00e9".encode("utf-8")])
+
+    def test_stream_matcher_reads_bytes(self):
+        dfa = minDFA("a\u00e9", utf8=True)
+        data = "xa\u00e9".encode("utf-8")
+        for encoding in ["utf-8", None]:
+            matcher = StreamMatcher(dfa, encoding)
+            self.assertEqual(matcher.feed(data[:2]) + matcher.feed(data[2:]) + matcher.finish(), [Match(1, 4)])
+
+    def test_character_class_in_character_mode(self):
+        dfa = minDFA("[a-c]d", ["a", "b", "c", "d"])
+        match = DFACodeGenerator(dfa).compile()
+        self.assertTrue(match("bd"))
+        self.assertFalse(match("dd"))
+
+
+class TestNFAReducer(unittest.TestCase):
+
+    def test_reduction_preserves_language(self):
+        alphabet = ["a", "b", "c", "d", "e"]
+        for regex in ["(ab+c)*d", "a{3}b", "ab*+cd", "(a+b)*a(a+b)", "a+(b*c)+de",
+                      "(((b+ca)){1,2}){2}"]:
+            nfa = NFAfromRegex(regex, alphabet).getNFA()
+            reducer = NFAReducer(nfa)
+            reduced = reducer.getReducedNFA()
+            self.assertTrue(ProductDFA.isEquivalent(DFAfromNFA(nfa, alphabet).getMinimisedDFA(),
+                                                    DFAfromNFA(reduced, alphabet).getMinimisedDFA()), regex)
+            self.assertLess(reducer.getStats()["states"][1], reducer.getStats()["states"][0], regex)
+
+    def test_reduced_nfa_has_no_epsilons(self):
+        reducer = NFAReducer(NFAfromRegex("(ab+c)*d", ["a", "b", "c", "d"]).getNFA())
+        reduced = reducer.getReducedNFA()
+        for tostates in reduced.transitions.values():
+            for chars in tostates.values():
+                self.assertNotIn(Automata.epsilon(), chars)
+        self.assertEqual(reducer.getStats()["states"], [12, 3])
+        self.assertEqual(reduced.startstate, 1)
+
+
+class TestSubexpressionSharing(unittest.TestCase):
+
+    def test_repeated_subexpressions_are_built_once(self):
+        parser = NFAfromRegex("(ab+cd)(ab+cd)", ["a", "b", "c", "d"])
+        # a, b, ab, c, d, cd, ab+cd and the final concatenation
+        self.assertEqual(len(parser.cache), 8)
+
+    def test_cache_shared_between_patterns(self):
+        cache = {}
+        alphabet = ["a", "b", "c", "d"]
+        first = NFAfromRegex("(ab+cd)*", alphabet, cache=cache)
+        size = len(cache)
+        second = NFAfromRegex("(ab+cd)*", alphabet, cache=cache)
+        self.assertEqual(len(cache), size)
+        self.assertIsNot(first.getNFA(), second.getNFA())
+        self.assertEqual(first.getNFA().transitions, second.getNFA().transitions)
+        third = NFAfromRegex("(ab+cd)*d", alphabet, cache=cache)
+        self.assertEqual(len(cache), size + 1)
+        self.assertTrue(ProductDFA.isEquivalent(
+            DFAfromNFA(third.getNFA(), alphabet).getMinimisedDFA(),
+            minDFA("(ab+cd)*d", alphabet)))
+
+    def test_result_does_not_alias_cache(self):
+        cache = {}
+        alphabet = ["a", "b"]
+        first = NFAfromRegex("ab*", alphabet, cache=cache).getNFA()
+        first.addtransition(first.startstate, first.startstate, "b")
+        second = NFAfromRegex("ab*", alphabet, cache=cache).getNFA()
+        match = DFACodeGenerator(DFAfromNFA(second, alphabet).getMinimisedDFA()).compile()
+        self.assertFalse(match("bab"))
+        self.assertTrue(match("abb"))
+
+    def test_shared_cache_avoids_work(self):
+        # Rules with a common prefix: with a shared cache the prefix is built once, not once per rule
+        prefix = "(ab+cd)*efgh" * 4
+        rules = [prefix + c for c in "abcdefgh"]
+        alphabet = list("abcdefgh")
+
+        def countTransitions(cache):
+            with mock.patch.object(Automata, "addtransition", autospec=True,
+                                   side_effect=Automata.addtransition) as added:
+                for rule in rules:
+                    NFAfromRegex(rule, alphabet, cache={} if cache is None else cache)
+            return added.call_count
+
+        self.assertLess(countTransitions({}) * 3, countTransitions(None))
+
+
+class TestTaggedDFA(unittest.TestCase):
+
+    def test_group_spans(self):
+        tdfa = buildDFA("((ab)+a)(b*)c", ["a", "b", "c"], TaggedDFAfromNFA, captures=True)
+        self.assertEqual(tdfa.getGroupCount(), 3)
+        self.assertEqual(tdfa.match("abbc"), [(0, 4), (0, 2), (0, 2), (2, 3)])
+        self.assertEqual(tdfa.match("ac"), [(0, 2), (0, 1), None, (1, 1)])
+        self.assertIsNone(tdfa.match("abca"))
+
+    def test_greedy_star_and_last_iteration(self):
+        self.assertEqual(buildDFA("(a*)(a*)", ["a"], TaggedDFAfromNFA, captures=True).match("aa"), [(0, 2), (0, 2), (2, 2)])
+        self.assertEqual(buildDFA("a(b+c)*d", ["a", "b", "c", "d"], TaggedDFAfromNFA, captures=True).match("abcbd"), [(0, 5), (3, 4)])
+        self.assertEqual(buildDFA("(a(b)*)*", ["a", "b"], TaggedDFAfromNFA, captures=True).match("abbab"), [(0, 5), (3, 5), (4, 5)])
+
+    def test_group_containing_repetition(self):
+        self.assertEqual(buildDFA("(c{2}a)", ["a", "c"], TaggedDFAfromNFA, captures=True).match("cca"), [(0, 3), (0, 3)])
+        self.assertEqual(buildDFA("((c){2}(a){2})c", ["a", "c"], TaggedDFAfromNFA, captures=True).match("ccaac"),
+                         [(0, 5), (0, 4), (1, 2), (3, 4)])
+
+    def test_captures_do_not_change_language(self):
+        alphabet = ["a", "b", "c"]
+        self.assertTrue(ProductDFA.isEquivalent(minDFA("(a(b+c))*", alphabet, captures=True),
+                                                minDFA("(a(b+c))*", alphabet)))
+
+    def test_reduction_drops_tags(self):
+        alphabet = ["a", "b", "c"]
+        reduced = NFAReducer(NFAfromRegex("((ab)+a)(b*)c", alphabet, captures=True).getNFA()).getReducedNFA()
+        labels = {char for tostates in reduced.transitions.values() for chars in tostates.values() for char in chars}
+        self.assertEqual(labels, {"a", "b", "c"})
+        self.assertTrue(ProductDFA.isEquivalent(DFAfromNFA(reduced, alphabet).getMinimisedDFA(),
+                                                minDFA("((ab)+a)(b*)c", alphabet)))
+
+
+class TestTransitionStorage(unittest.TestCase):
+
+    def test_formats_agree(self):
+        dfa = minDFA("(ab+c)*d+a{3}b", ["a", "b", "c", "d"])
+        match = DFACodeGenerator(dfa).compile()
+        strings = ["", "d", "abd", "cabcd", "aaab", "aab", "abcd", "dd", "ab", "x"]
+        for storage in (DenseTable, DedupTable, DefaultTable, CombTable):
+            table = storage(dfa)
+            for string in strings:
+                self.assertEqual(table.match(string), match(string), (storage.name, string))
+
+    def test_compressed_formats_are_smaller(self):
+        alphabet = [chr(i) for i in range(97, 123)]
+        dfa = minDFA("abcdefghijklmnopqrstuvwxyz", alphabet)
+        sizes = compareStorage(dfa)
+        self.assertEqual(set(sizes), {"automata", "dense", "dedup", "default", "comb"})
+        self.assertLess(sizes["comb"], sizes["dense"])
+        self.assertLess(sizes["dense"], sizes["automata"])
+        self.assertLess(len(CombTable(dfa).nexts), 2 * len(alphabet))
+
+
 if __name__ == '__main__':
     unittest.main()